@@ -0,0 +1,167 @@
+"""
+Compiled numeric kernels for trajectories and the preview.
+
+The kernels here work on plain floats and preallocated NumPy buffers so
+numba can compile them: trajectory.py and trajectory_batch.py trace paths
+with them, preview.py interpolates its frames with them. HAVE_NUMBA tells
+callers whether they are compiled or plain Python.
+"""
+
+import math
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # numba is optional; fall back to plain Python
+    HAVE_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True)
+def _time_to_wall(x, y, vx, vy, width, height):
+    """
+    Time until a particle reaches the nearest wall ahead (inf if not moving
+    towards one), and whether that wall is the left or right one.
+    
+    Walls less than 1e-10 away (the particle is sitting on them) don't
+    count; ties go to the x wall.
+    """
+    time_to_wall = math.inf
+    hit_x = False
+    if vx < 0:
+        t = -x / vx
+        if 1e-10 < t < time_to_wall:
+            time_to_wall = t
+            hit_x = True
+    elif vx > 0:
+        t = (width - x) / vx
+        if 1e-10 < t < time_to_wall:
+            time_to_wall = t
+            hit_x = True
+    if vy < 0:
+        t = -y / vy
+        if 1e-10 < t < time_to_wall:
+            time_to_wall = t
+            hit_x = False
+    elif vy > 0:
+        t = (height - y) / vy
+        if 1e-10 < t < time_to_wall:
+            time_to_wall = t
+            hit_x = False
+    return time_to_wall, hit_x
+
+
+@njit(cache=True)
+def _trace_into(
+    out,
+    x, y, vx, vy,
+    from_time, to_time,
+    width, height
+):
+    """
+    Trace a bouncing path from from_time towards to_time (either direction).
+    
+    Velocity must already be normalized and point along the direction of
+    travel. Writes (x, y, time) rows into `out` in the order they were
+    visited: the start point, every wall bounce, and the final point at
+    to_time. Returns the number of rows written, or -1 if `out` is too small.
+    """
+    direction = 1.0 if to_time >= from_time else -1.0
+    capacity = out.shape[0]
+    if capacity == 0:
+        return -1
+    
+    out[0, 0] = x
+    out[0, 1] = y
+    out[0, 2] = from_time
+    n = 1
+    
+    current_time = from_time
+    while (to_time - current_time) * direction > 0:
+        if n == capacity:
+            return -1
+        
+        time_to_wall, hit_x = _time_to_wall(x, y, vx, vy, width, height)
+        
+        remaining_time = (to_time - current_time) * direction
+        if time_to_wall >= remaining_time:
+            # Reach to_time before hitting a wall
+            out[n, 0] = x + vx * remaining_time
+            out[n, 1] = y + vy * remaining_time
+            out[n, 2] = to_time
+            n += 1
+            break
+        
+        # Move to wall and bounce
+        x += vx * time_to_wall
+        y += vy * time_to_wall
+        current_time += direction * time_to_wall
+        
+        # Clamp to wall boundaries to avoid floating point drift
+        x = max(0.0, min(width, x))
+        y = max(0.0, min(height, y))
+        
+        out[n, 0] = x
+        out[n, 1] = y
+        out[n, 2] = current_time
+        n += 1
+        
+        if hit_x:
+            vx = -vx
+        else:
+            vy = -vy
+    
+    return n
+
+
+# Compile (or load the cached build of) the trajectory kernel once at import
+_trace_into(np.empty((4, 3)), 1.0, 1.0, 1.0, 1.0, 0.0, 1.0, 2.0, 2.0)
+
+
+@njit(cache=True)
+def _interpolate_frames(
+    kf_t, kf_x, kf_y, counts,
+    start, end, first_t, last_t,
+    frame_times, out_xy, out_visible
+):
+    """
+    Interpolate every particle's position at every frame time.
+    
+    Works on padded (P, K) float32 keyframe tables the same way as
+    SimulationPreview._positions_at, writing (F, P, 2) positions into
+    out_xy and the (F, P) visibility mask into out_visible. last_t
+    already includes the end-of-trajectory tolerance.
+    """
+    zero = np.float32(0.0)
+    one = np.float32(1.0)
+    num_particles, num_keyframes = kf_t.shape
+    for frame in range(frame_times.shape[0]):
+        time = frame_times[frame]
+        for row in range(num_particles):
+            # Segment index: last keyframe at or before time, kept inside the row
+            idx = -1
+            for col in range(num_keyframes):
+                if kf_t[row, col] > time:
+                    break
+                idx = col
+            idx = min(max(idx, 0), max(counts[row] - 2, 0))
+            
+            # Linear interpolation (equal-time or padded segments hold the first keyframe)
+            t0 = kf_t[row, idx]
+            span = kf_t[row, idx + 1] - t0
+            frac = zero
+            if span > 0 and span < math.inf:
+                frac = min((time - t0) / span, one)
+            x0 = kf_x[row, idx]
+            y0 = kf_y[row, idx]
+            out_xy[frame, row, 0] = x0 + frac * (kf_x[row, idx + 1] - x0)
+            out_xy[frame, row, 1] = y0 + frac * (kf_y[row, idx + 1] - y0)
+            
+            out_visible[frame, row] = (
+                start[row] <= time <= end[row] and first_t[row] <= time <= last_t[row]
+            )
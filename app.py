@@ -4,13 +4,239 @@ No database - simulation runs in memory and returns JSON.
 """
 
 from flask import Flask, render_template, jsonify, request, send_from_directory
-from simulation import Simulation
-from particle import ParticleType
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Tuple
+import gzip
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+import numpy as np
+from simulation import Simulation, SimulationResult
 import os
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; clients asking for it get JSON
+    msgpack = None
+
 app = Flask(__name__)
 
 
+def _new_executor() -> ProcessPoolExecutor:
+    """Create the worker pool for simulation jobs."""
+    # Spawn rather than fork: the threaded server starts workers from
+    # request threads, and forking a multi-threaded process can deadlock
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+
+# Simulations run in worker processes so request threads stay free;
+# clients poll /api/simulate/<job_id> for pending jobs. Jobs nobody polls to
+# completion are dropped after JOB_TTL seconds, or oldest first past MAX_JOBS.
+executor = _new_executor()
+jobs: 'OrderedDict[str, Tuple[Future, str, float]]' = OrderedDict()  # job_id -> (future, response format, submit time)
+JOB_TTL = 600
+MAX_JOBS = 1000
+
+# Seeded simulations are deterministic, so the job for identical parameters
+# is shared, including its finished result (the SEEDED_CACHE_SIZE most recent)
+seeded_jobs: 'OrderedDict[Tuple[str, str], Future]' = OrderedDict()
+SEEDED_CACHE_SIZE = 64
+_jobs_lock = threading.Lock()  # guards executor, jobs and seeded_jobs
+
+MIMETYPES = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack'
+}
+
+# gzip JSON responses at least this many bytes long (same names as flask-compress)
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_LEVEL'] = 6
+
+
+def _json_default(obj):
+    """Fallback encoder hook for NumPy arrays when orjson is not installed."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _encode_json(payload: dict) -> bytes:
+    """Serialize payload (which may contain NumPy arrays) to JSON bytes."""
+    if orjson is None:
+        return json.dumps(payload, default=_json_default).encode('utf-8')
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _msgpack_default(obj):
+    """msgpack hook: NumPy arrays become raw little-endian float64 bytes."""
+    if isinstance(obj, np.ndarray):
+        return obj.astype('<f8').tobytes()
+    raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+
+def _encode(payload: dict, fmt: str) -> bytes:
+    """Serialize payload in the given response format ('json' or 'msgpack')."""
+    if fmt == 'msgpack':
+        return msgpack.packb(payload, use_bin_type=True, default=_msgpack_default)
+    return _encode_json(payload)
+
+
+def _response_format() -> str:
+    """Pick the response format from the request's Accept header."""
+    if msgpack is not None and 'msgpack' in request.headers.get('Accept', ''):
+        return 'msgpack'
+    return 'json'
+
+
+def _build_payload(params: dict, result: SimulationResult) -> dict:
+    """Convert a simulation result into the /api/simulate response payload."""
+    # Output is already rounded by Simulation.run; keyframes come from the
+    # result's packed arrays so each particle's keyframes are plain slices
+    xs = np.ascontiguousarray(result.kf_xy[:, 0])
+    ys = np.ascontiguousarray(result.kf_xy[:, 1])
+    ts = np.ascontiguousarray(result.kf_time)
+    offsets = result.kf_offset.tolist()
+    
+    # Convert to JSON-friendly format (keyframes as parallel x / y / t arrays)
+    particles_data = []
+    for i, particle in enumerate(result.particles):
+        start, end = offsets[i], offsets[i + 1]
+        keyframes = {
+            'x': xs[start:end],
+            'y': ys[start:end],
+            't': ts[start:end]
+        }
+        
+        particles_data.append({
+            'id': particle.id,
+            'type': particle.particle_type.name,
+            'start_time': particle.start_time,
+            'end_time': particle.end_time if particle.end_time else params['animation_duration'],
+            'keyframes': keyframes
+        })
+    
+    collisions_data = [
+        {
+            'id': c.id,
+            'time': c.time,
+            'x': c.x,
+            'y': c.y,
+            'particle1_id': c.particle1_id,
+            'particle2_id': c.particle2_id,
+            'result_particle_id': c.result_particle_id
+        }
+        for c in result.collisions
+    ]
+    
+    # NO2 is 0 and N2O4 is 1, so the sum of types is the N2O4 count
+    n2o4_count = sum(p.particle_type for p in result.particles)
+    
+    return {
+        'success': True,
+        'params': {
+            'container_width': params['container_width'],
+            'container_height': params['container_height'],
+            'animation_duration': params['animation_duration']
+        },
+        'particles': particles_data,
+        'collisions': collisions_data,
+        'summary': {
+            'total_particles': len(particles_data),
+            'no2_count': len(particles_data) - n2o4_count,
+            'n2o4_count': n2o4_count,
+            'collision_count': len(collisions_data)
+        }
+    }
+
+
+def _run_sim_worker(params: dict, fmt: str = 'json') -> bytes:
+    """Run a simulation and encode its response body (executes in a worker process)."""
+    result = Simulation(**params).run()
+    return _encode(_build_payload(params, result), fmt)
+
+
+def _submit(params: dict, fmt: str) -> Future:
+    """Submit a simulation job, replacing the worker pool if a worker crashed (hold _jobs_lock)."""
+    global executor
+    try:
+        return executor.submit(_run_sim_worker, params, fmt)
+    except BrokenProcessPool:
+        executor = _new_executor()
+        return executor.submit(_run_sim_worker, params, fmt)
+
+
+def _submit_seeded(params: dict, fmt: str) -> Future:
+    """Submit (or reuse) the simulation job for a seeded parameter set."""
+    # Keyed by the params as JSON text, so list seeds (valid for np.random.seed) work too
+    key = (json.dumps(params, sort_keys=True), fmt)
+    with _jobs_lock:
+        future = seeded_jobs.get(key)
+        if future is None or (future.done() and future.exception() is not None):
+            # Failed runs are retried rather than served from the cache
+            future = _submit(params, fmt)
+            seeded_jobs[key] = future
+            if len(seeded_jobs) > SEEDED_CACHE_SIZE:
+                seeded_jobs.popitem(last=False)
+        seeded_jobs.move_to_end(key)
+    return future
+
+
+def _add_job(future: Future, fmt: str) -> str:
+    """Register a pending job for polling, dropping expired ones; returns its job_id."""
+    job_id = uuid.uuid4().hex
+    now = time.monotonic()
+    with _jobs_lock:
+        while jobs and (len(jobs) >= MAX_JOBS or now - next(iter(jobs.values()))[2] > JOB_TTL):
+            jobs.popitem(last=False)
+        jobs[job_id] = (future, fmt, now)
+    return job_id
+
+
+def _job_response(future: Future, fmt: str):
+    """Response for a finished job: the encoded result or its error."""
+    error = future.exception()
+    if error is not None:
+        return jsonify({'error': str(error)}), 500
+    return app.response_class(future.result(), mimetype=MIMETYPES[fmt])
+
+
+@app.after_request
+def compress_response(response):
+    """Gzip large JSON responses when the client accepts it."""
+    if (
+        response.mimetype != 'application/json'
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+    ):
+        return response
+    
+    body = response.get_data()
+    if len(body) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    
+    # The body depends on Accept-Encoding from here on, compressed or not,
+    # so shared caches must not hand one client's variant to another
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+    
+    response.set_data(gzip.compress(body, compresslevel=app.config['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
 @app.route('/')
 def index():
     """Serve the main page."""
@@ -26,7 +252,15 @@ def static_files(filename):
 @app.route('/api/simulate', methods=['POST'])
 def simulate():
     """
-    Run simulation with provided parameters and return keyframe data.
+    Start a simulation with provided parameters.
+    
+    Returns the keyframe data directly if an identical seeded run has
+    already finished; otherwise responds 202 with a job_id to poll at
+    /api/simulate/<job_id>.
+    
+    Send "Accept: application/msgpack" to get the result as msgpack
+    instead of JSON; keyframe x / y / t columns are then raw
+    little-endian float64 bytes rather than number arrays.
     
     Expected JSON payload:
     {
@@ -60,64 +294,42 @@ def simulate():
                 'error': f"Cannot have {params['num_collisions']} collisions with only {params['num_particles']} particles. Need at least {params['num_collisions'] * 2}."
             }), 400
         
-        # Run simulation
-        sim = Simulation(**params)
-        result = sim.run()
+        fmt = _response_format()
         
-        # Convert to JSON-friendly format
-        particles_data = []
-        for particle in result.particles:
-            keyframes = [
-                {
-                    'x': round(kf.x, 2),
-                    'y': round(kf.y, 2),
-                    'time': round(kf.time, 4)
-                }
-                for kf in particle.keyframes
-            ]
-            
-            particles_data.append({
-                'id': particle.id,
-                'type': particle.particle_type.value,
-                'start_time': round(particle.start_time, 4),
-                'end_time': round(particle.end_time, 4) if particle.end_time else params['animation_duration'],
-                'keyframes': keyframes
-            })
+        # Seeded runs share cached jobs; unseeded runs must be fresh every time
+        if params['random_seed'] is not None:
+            future = _submit_seeded(params, fmt)
+        else:
+            with _jobs_lock:
+                future = _submit(params, fmt)
         
-        collisions_data = [
-            {
-                'id': c.id,
-                'time': round(c.time, 4),
-                'x': round(c.x, 2),
-                'y': round(c.y, 2),
-                'particle1_id': c.particle1_id,
-                'particle2_id': c.particle2_id,
-                'result_particle_id': c.result_particle_id
-            }
-            for c in result.collisions
-        ]
+        if future.done():
+            return _job_response(future, fmt)
         
-        return jsonify({
-            'success': True,
-            'params': {
-                'container_width': params['container_width'],
-                'container_height': params['container_height'],
-                'animation_duration': params['animation_duration']
-            },
-            'particles': particles_data,
-            'collisions': collisions_data,
-            'summary': {
-                'total_particles': len(particles_data),
-                'no2_count': len([p for p in particles_data if p['type'] == 'NO2']),
-                'n2o4_count': len([p for p in particles_data if p['type'] == 'N2O4']),
-                'collision_count': len(collisions_data)
-            }
-        })
+        job_id = _add_job(future, fmt)
+        return jsonify({'job_id': job_id, 'status': 'pending'}), 202
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/simulate/<job_id>', methods=['GET'])
+def simulation_status(job_id):
+    """Poll a simulation job; returns keyframe data once it has finished."""
+    with _jobs_lock:
+        job = jobs.get(job_id)
+        if job is not None and job[0].done():
+            del jobs[job_id]
+    if job is None:
+        return jsonify({'error': f"Unknown job: {job_id}"}), 404
+    
+    future, fmt, _ = job
+    if not future.done():
+        return jsonify({'job_id': job_id, 'status': 'pending'}), 202
+    
+    return _job_response(future, fmt)
+
+
 if __name__ == '__main__':
     print("Starting Particle Simulation Server...")
     print("Open http://localhost:5000 in your browser")
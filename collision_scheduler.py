@@ -5,17 +5,20 @@ and computing backward trajectories for colliding particles.
 """
 
 import numpy as np
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
 
 from particle import Particle, ParticleType, Collision
-from trajectory import (
-    calculate_backward_trajectory,
-    calculate_forward_trajectory,
-    random_velocity,
-    average_velocity,
-    normalize_velocity
-)
+from trajectory import max_keyframes, random_velocity, average_velocity, normalize_velocity
+from trajectory_batch import trace_trajectories
+
+
+# Shared generator for collision placement when the caller doesn't supply one
+_rng = np.random.default_rng()
+
+# A planned trajectory: start (x, y), velocity normalized along the direction
+# of travel, and its (from_time, to_time) span; to_time < from_time traces backwards
+Path = Tuple[float, float, float, float, float, float]
 
 
 @dataclass
@@ -32,7 +35,8 @@ def schedule_collisions(
     animation_duration: float,
     container_width: float,
     container_height: float,
-    collision_margin: float
+    collision_margin: float,
+    rng: Optional[np.random.Generator] = None
 ) -> CollisionSchedule:
     """
     Schedule collisions evenly across the animation duration.
@@ -44,6 +48,7 @@ def schedule_collisions(
         container_width: Container width in pixels
         container_height: Container height in pixels
         collision_margin: Minimum distance from walls for collision points
+        rng: Random generator for collision points (defaults to a shared module generator)
     
     Returns:
         CollisionSchedule with collision details and particle assignments
@@ -58,17 +63,15 @@ def schedule_collisions(
     
     # Calculate evenly spaced collision times
     # Leave some margin at start and end for visual clarity
+    # (a single collision is centred rather than placed at the first margin)
     time_margin = animation_duration * 0.1
-    available_duration = animation_duration - (2 * time_margin)
     
     if num_collisions == 1:
         collision_times = [animation_duration / 2]
     else:
-        time_step = available_duration / (num_collisions - 1) if num_collisions > 1 else 0
-        collision_times = [
-            time_margin + i * time_step 
-            for i in range(num_collisions)
-        ]
+        collision_times = np.linspace(
+            time_margin, animation_duration - time_margin, num_collisions
+        ).tolist()
     
     # Randomly assign particles to collisions
     particle_ids = list(range(1, num_particles + 1))
@@ -77,16 +80,21 @@ def schedule_collisions(
     colliding_ids = particle_ids[:particles_needed]
     non_colliding_ids = particle_ids[particles_needed:]
     
-    # Create collision objects
+    # Random collision points within margins, drawn in a single call
+    if rng is None:
+        rng = _rng
+    # (low + span * random() rather than rng.uniform, which rejects a negative
+    # span when the container is narrower than twice the margin)
+    low = np.array([collision_margin, collision_margin])
+    span = np.array([container_width, container_height]) - 2 * collision_margin
+    collision_points = low + span * rng.random((num_collisions, 2))
+    
+    # Create collision objects (tolist() converts to Python floats in one call)
     collisions = []
-    for i in range(num_collisions):
-        # Random collision point within margins
-        x = np.random.uniform(collision_margin, container_width - collision_margin)
-        y = np.random.uniform(collision_margin, container_height - collision_margin)
-        
+    for i, (time, (x, y)) in enumerate(zip(collision_times, collision_points.tolist())):
         collision = Collision(
             id=i + 1,
-            time=collision_times[i],
+            time=time,
             x=x,
             y=y,
             particle1_id=colliding_ids[i * 2],
@@ -102,134 +110,143 @@ def schedule_collisions(
     )
 
 
-def create_colliding_particles(
+def precompute_collision_velocities(
+    n: int,
+    speed: float,
+    rng: Optional[np.random.Generator] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Generate incoming velocities for the particle pairs of n collisions at once.
+    
+    The second particle of each pair travels roughly opposite to the first
+    so the two come from different directions for visual interest.
+    
+    Args:
+        n: Number of collisions
+        speed: Particle speed in pixels/second
+        rng: Random generator (defaults to a shared module generator)
+    
+    Returns:
+        Tuple of (vx1, vy1, vx2, vy2) arrays, each of length n
+    """
+    if rng is None:
+        rng = _rng
+    angles1 = rng.uniform(0, 2 * np.pi, n)
+    offsets = rng.uniform(-np.pi/3, np.pi/3, n)
+    angles2 = angles1 + np.pi + offsets  # Roughly opposite
+    
+    vx1, vy1 = speed * np.cos(angles1), speed * np.sin(angles1)
+    vx2, vy2 = speed * np.cos(angles2), speed * np.sin(angles2)
+    return vx1, vy1, vx2, vy2
+
+
+def plan_collision_paths(
     collision: Collision,
     speed: float,
-    container_width: float,
-    container_height: float,
-    next_n2o4_id: int,
-    animation_duration: float
-) -> Tuple[Particle, Particle, Particle]:
+    animation_duration: float,
+    vx1: float,
+    vy1: float,
+    vx2: float,
+    vy2: float
+) -> Tuple[Tuple[Path, Path, Path], Tuple[float, float]]:
     """
-    Create two NO2 particles that will collide and the resulting N2O4 particle.
+    Plan the trajectories of a collision's two NO2 particles and its N2O4 particle.
     
-    Uses backward trajectory calculation to determine where particles start,
-    then forward trajectory for the N2O4 particle.
+    Each NO2 particle is traced backwards from the collision point (with
+    reversed velocity) to time 0; the N2O4 particle forwards from the
+    collision to the end of the animation at the averaged velocity.
     
     Args:
         collision: The collision specification
         speed: Particle speed in pixels/second
-        container_width: Container width
-        container_height: Container height
-        next_n2o4_id: ID to assign to the N2O4 particle
         animation_duration: Total animation duration for N2O4 trajectory
+        vx1, vy1: Incoming velocity of the first particle
+        vx2, vy2: Incoming velocity of the second particle
     
     Returns:
-        Tuple of (particle1, particle2, n2o4_particle)
+        Tuple of ((particle1 path, particle2 path, N2O4 path), N2O4 velocity)
     """
-    # Generate random incoming velocities for the two particles
-    # They should be coming from different directions for visual interest
-    angle1 = np.random.uniform(0, 2 * np.pi)
-    angle2 = angle1 + np.pi + np.random.uniform(-np.pi/3, np.pi/3)  # Roughly opposite
-    
-    vx1, vy1 = speed * np.cos(angle1), speed * np.sin(angle1)
-    vx2, vy2 = speed * np.cos(angle2), speed * np.sin(angle2)
-    
-    # Calculate backward trajectories for both particles
-    keyframes1 = calculate_backward_trajectory(
-        end_x=collision.x,
-        end_y=collision.y,
-        vx=vx1,
-        vy=vy1,
-        end_time=collision.time,
-        start_time=0.0,
-        width=container_width,
-        height=container_height,
-        speed=speed
+    n2o4_velocity = average_velocity(vx1, vy1, vx2, vy2, speed)
+    paths = (
+        (collision.x, collision.y, *normalize_velocity(-vx1, -vy1, speed), collision.time, 0.0),
+        (collision.x, collision.y, *normalize_velocity(-vx2, -vy2, speed), collision.time, 0.0),
+        (collision.x, collision.y, *normalize_velocity(*n2o4_velocity, speed),
+         collision.time, animation_duration)
     )
+    return paths, n2o4_velocity
+
+
+def build_colliding_particles(
+    collision: Collision,
+    next_n2o4_id: int,
+    animation_duration: float,
+    velocities: Tuple[Tuple[float, float], Tuple[float, float], Tuple[float, float]],
+    keyframes: Tuple[np.ndarray, np.ndarray, np.ndarray]
+) -> Tuple[Particle, Particle, Particle]:
+    """
+    Create a collision's two NO2 particles and the resulting N2O4 particle.
     
-    keyframes2 = calculate_backward_trajectory(
-        end_x=collision.x,
-        end_y=collision.y,
-        vx=vx2,
-        vy=vy2,
-        end_time=collision.time,
-        start_time=0.0,
-        width=container_width,
-        height=container_height,
-        speed=speed
-    )
+    Args:
+        collision: The collision specification
+        next_n2o4_id: ID to assign to the N2O4 particle
+        animation_duration: Total animation duration
+        velocities: Velocities of particle1, particle2 and the N2O4 particle
+        keyframes: Traced (k, 3) keyframes of the paths from plan_collision_paths
     
-    # Create NO2 particles
+    Returns:
+        Tuple of (particle1, particle2, n2o4_particle)
+    """
     particle1 = Particle(
         id=collision.particle1_id,
         particle_type=ParticleType.NO2,
-        keyframes=keyframes1,
+        keyframes_arr=keyframes[0],
         start_time=0.0,
         end_time=collision.time,
         collision_id=collision.id,
-        velocity=(vx1, vy1)
+        velocity=velocities[0]
     )
     
     particle2 = Particle(
         id=collision.particle2_id,
         particle_type=ParticleType.NO2,
-        keyframes=keyframes2,
+        keyframes_arr=keyframes[1],
         start_time=0.0,
         end_time=collision.time,
         collision_id=collision.id,
-        velocity=(vx2, vy2)
-    )
-    
-    # Calculate N2O4 velocity (average of incoming velocities)
-    n2o4_vx, n2o4_vy = average_velocity(vx1, vy1, vx2, vy2, speed)
-    
-    # Calculate forward trajectory for N2O4 from collision to animation end
-    n2o4_keyframes = calculate_forward_trajectory(
-        start_x=collision.x,
-        start_y=collision.y,
-        vx=n2o4_vx,
-        vy=n2o4_vy,
-        start_time=collision.time,
-        end_time=animation_duration,
-        width=container_width,
-        height=container_height,
-        speed=speed
+        velocity=velocities[1]
     )
     
     n2o4_particle = Particle(
         id=next_n2o4_id,
         particle_type=ParticleType.N2O4,
-        keyframes=n2o4_keyframes,
+        keyframes_arr=keyframes[2],
         start_time=collision.time,
         end_time=animation_duration,
         collision_id=collision.id,
-        velocity=(n2o4_vx, n2o4_vy)
+        velocity=velocities[2]
     )
     
     return particle1, particle2, n2o4_particle
 
 
-def create_non_colliding_particle(
-    particle_id: int,
+def plan_non_colliding_path(
     speed: float,
     animation_duration: float,
     container_width: float,
     container_height: float
-) -> Particle:
+) -> Tuple[Path, Tuple[float, float]]:
     """
-    Create an NO2 particle that doesn't collide with anything.
+    Plan the trajectory of an NO2 particle that doesn't collide with anything.
     Starts at a random position with random velocity.
     
     Args:
-        particle_id: ID for the particle
         speed: Particle speed in pixels/second
         animation_duration: Total animation duration
         container_width: Container width
         container_height: Container height
     
     Returns:
-        Particle with full trajectory from start to end
+        Tuple of (path, velocity)
     """
     # Random starting position
     margin = 10  # Small margin from edges
@@ -239,26 +256,116 @@ def create_non_colliding_particle(
     # Random velocity
     vx, vy = random_velocity(speed)
     
-    # Calculate full trajectory
-    keyframes = calculate_forward_trajectory(
-        start_x=start_x,
-        start_y=start_y,
-        vx=vx,
-        vy=vy,
-        start_time=0.0,
-        end_time=animation_duration,
-        width=container_width,
-        height=container_height,
-        speed=speed
-    )
-    
+    path = (start_x, start_y, *normalize_velocity(vx, vy, speed), 0.0, animation_duration)
+    return path, (vx, vy)
+
+
+def build_non_colliding_particle(
+    particle_id: int,
+    animation_duration: float,
+    velocity: Tuple[float, float],
+    keyframes: np.ndarray
+) -> Particle:
+    """Create a non-colliding NO2 particle from its traced path."""
     return Particle(
         id=particle_id,
         particle_type=ParticleType.NO2,
-        keyframes=keyframes,
+        keyframes_arr=keyframes,
         start_time=0.0,
         end_time=animation_duration,
         collision_id=None,
-        velocity=(vx, vy)
+        velocity=velocity
     )
 
+
+def _trace_paths(
+    paths: List[Path],
+    speed: float,
+    animation_duration: float,
+    container_width: float,
+    container_height: float
+) -> List[np.ndarray]:
+    """Trace planned paths into a buffer sized for the longest possible trajectory."""
+    buffer = np.zeros((
+        len(paths),
+        max_keyframes(speed, animation_duration, container_width, container_height),
+        3
+    ))
+    return trace_trajectories(
+        buffer,
+        *np.array(paths, dtype=np.float64).reshape(-1, 6).T,
+        float(container_width), float(container_height)
+    )
+
+
+def create_colliding_particles(
+    collision: Collision,
+    speed: float,
+    container_width: float,
+    container_height: float,
+    next_n2o4_id: int,
+    animation_duration: float,
+    vx1: float,
+    vy1: float,
+    vx2: float,
+    vy2: float
+) -> Tuple[Particle, Particle, Particle]:
+    """
+    Create two NO2 particles that will collide and the resulting N2O4 particle.
+    
+    Uses backward trajectory calculation to determine where particles start,
+    then forward trajectory for the N2O4 particle.
+    
+    Args:
+        collision: The collision specification
+        speed: Particle speed in pixels/second
+        container_width: Container width
+        container_height: Container height
+        next_n2o4_id: ID to assign to the N2O4 particle
+        animation_duration: Total animation duration for N2O4 trajectory
+        vx1, vy1: Incoming velocity of the first particle
+        vx2, vy2: Incoming velocity of the second particle
+    
+    Returns:
+        Tuple of (particle1, particle2, n2o4_particle)
+    """
+    paths, n2o4_velocity = plan_collision_paths(
+        collision, speed, animation_duration, vx1, vy1, vx2, vy2
+    )
+    keyframes = _trace_paths(
+        list(paths), speed, animation_duration, container_width, container_height
+    )
+    return build_colliding_particles(
+        collision, next_n2o4_id, animation_duration,
+        ((vx1, vy1), (vx2, vy2), n2o4_velocity), tuple(keyframes)
+    )
+
+
+def create_non_colliding_particle(
+    particle_id: int,
+    speed: float,
+    animation_duration: float,
+    container_width: float,
+    container_height: float
+) -> Particle:
+    """
+    Create an NO2 particle that doesn't collide with anything.
+    Starts at a random position with random velocity.
+    
+    Args:
+        particle_id: ID for the particle
+        speed: Particle speed in pixels/second
+        animation_duration: Total animation duration
+        container_width: Container width
+        container_height: Container height
+    
+    Returns:
+        Particle with full trajectory from start to end
+    """
+    path, velocity = plan_non_colliding_path(
+        speed, animation_duration, container_width, container_height
+    )
+    keyframes, = _trace_paths(
+        [path], speed, animation_duration, container_width, container_height
+    )
+    return build_non_colliding_particle(particle_id, animation_duration, velocity, keyframes)
@@ -1,20 +1,40 @@
 """
 Export utilities for generating CSV output for Rive animation.
+
+CSV files are written with the stdlib csv module; pandas is only imported
+when one of the generate_*_dataframe helpers is called.
 """
 
-import pandas as pd
-from typing import List, Optional
+import csv
+import numpy as np
+from typing import TYPE_CHECKING, Dict, List, Optional
 from simulation import SimulationResult
 from particle import Particle, ParticleType
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# particle_type columns hold ParticleType codes (int8); these are their
+# labels, indexed by code, applied when writing CSV / DataFrame / Parquet
+PARTICLE_TYPE_LABELS = np.array([t.name for t in ParticleType])
+_CODED_COLUMNS = {'particle_type': PARTICLE_TYPE_LABELS}
+
 
-def generate_keyframe_dataframe(result: SimulationResult) -> pd.DataFrame:
+def _optional_ids(ids: List[Optional[int]]) -> np.ndarray:
+    """IDs as int64, or as float64 with NaN for the missing ones if any are (as pandas infers them)."""
+    if None in ids:
+        return np.array([np.nan if i is None else i for i in ids], dtype=np.float64)
+    return np.array(ids, dtype=np.int64)
+
+
+def _keyframe_columns(result: SimulationResult) -> Dict[str, np.ndarray]:
     """
-    Generate a DataFrame with all keyframe data for Rive animation.
+    Build the keyframe export columns for Rive animation.
     
-    The DataFrame includes:
+    The columns are:
     - particle_id: Unique identifier for the particle
-    - particle_type: NO2 or N2O4
+    - particle_type: NO2 or N2O4 (as ParticleType codes)
     - keyframe_idx: Index of the keyframe in the particle's trajectory
     - x: X coordinate in pixels
     - y: Y coordinate in pixels
@@ -25,68 +45,165 @@ def generate_keyframe_dataframe(result: SimulationResult) -> pd.DataFrame:
         result: SimulationResult from running the simulation
     
     Returns:
-        pandas DataFrame with keyframe data
+        Dict of column name to NumPy array, in CSV column order
     """
-    rows = []
+    # Gather the result's packed keyframes in (particle_type, particle_id)
+    # order so no sort is needed
+    particles = result.particles
+    order = sorted(range(len(particles)), key=lambda i: (particles[i].particle_type.name, particles[i].id))
+    starts = result.kf_offset[:-1][order]
+    counts = np.diff(result.kf_offset)[order]
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
     
-    for particle in result.particles:
-        keyframes = particle.keyframes
+    # Position of each output row within its particle's keyframes
+    keyframe_idxs = np.arange(total) - np.repeat(ends - counts, counts)
+    rows = np.repeat(starts, counts) + keyframe_idxs
+    
+    particle_ids = np.repeat(np.array([particles[i].id for i in order], dtype=np.int64), counts)
+    particle_types = np.repeat(np.array([particles[i].particle_type for i in order], dtype=np.int8), counts)
+    collision_ids = np.repeat(_optional_ids([particles[i].collision_id for i in order]), counts)
+    xs = result.kf_xy[rows, 0]
+    ys = result.kf_xy[rows, 1]
+    times = result.kf_time[rows]
+    
+    is_end = np.zeros(total, dtype=bool)
+    is_end[ends[counts > 0] - 1] = True
+    is_start = keyframe_idxs == 0
+    
+    # Duration to next keyframe (0 for last keyframe)
+    durations = np.diff(times, append=times[-1:])
+    durations[is_end] = 0.0
+    
+    return {
+        'particle_id': particle_ids,
+        'particle_type': particle_types,
+        'keyframe_idx': keyframe_idxs,
+        'x': xs.astype(np.float32),
+        'y': ys.astype(np.float32),
+        'time_sec': times,
+        'duration_to_next': np.round(durations, 4),
+        'is_start': is_start,
+        'is_end': is_end,
+        'collision_id': collision_ids
+    }
+
+
+def _collision_columns(result: SimulationResult) -> Dict[str, np.ndarray]:
+    """
+    Build the collision event export columns.
+    
+    Args:
+        result: SimulationResult from running the simulation
+    
+    Returns:
+        Dict of column name to NumPy array, in CSV column order
+    """
+    collisions = result.collisions
+    
+    return {
+        'collision_id': np.array([c.id for c in collisions], dtype=np.int64),
+        'time_sec': np.array([c.time for c in collisions], dtype=np.float64),
+        'x': np.array([c.x for c in collisions], dtype=np.float64),
+        'y': np.array([c.y for c in collisions], dtype=np.float64),
+        'no2_particle_1': np.array([c.particle1_id for c in collisions], dtype=np.int64),
+        'no2_particle_2': np.array([c.particle2_id for c in collisions], dtype=np.int64),
+        'n2o4_particle': np.array([c.result_particle_id for c in collisions], dtype=np.int64)
+    }
+
+
+def _summary_columns(result: SimulationResult) -> Dict[str, np.ndarray]:
+    """
+    Build the particle summary export columns, one row per particle.
+    
+    Args:
+        result: SimulationResult from running the simulation
+    
+    Returns:
+        Dict of column name to NumPy array, in CSV column order
+    """
+    # Build rows in (particle_type, particle_id) order so no sort is needed
+    particles = result.particles
+    order = sorted(range(len(particles)), key=lambda i: (particles[i].particle_type.name, particles[i].id))
+    offsets = result.kf_offset.tolist()
+    positions = result.kf_xy.tolist()
+    
+    columns = {
+        'particle_id': [], 'particle_type': [],
+        'start_time': [], 'end_time': [],
+        'start_x': [], 'start_y': [], 'end_x': [], 'end_y': [],
+        'num_keyframes': [], 'num_bounces': [], 'collision_id': []
+    }
+    
+    for i in order:
+        particle = particles[i]
+        start, end = offsets[i], offsets[i + 1]
+        start_pos = positions[start] if end > start else (np.nan, np.nan)
+        end_pos = positions[end - 1] if end > start else (np.nan, np.nan)
         
-        for i, kf in enumerate(keyframes):
-            # Calculate duration to next keyframe
-            if i < len(keyframes) - 1:
-                duration_to_next = keyframes[i + 1].time - kf.time
-            else:
-                duration_to_next = 0.0
-            
-            rows.append({
-                'particle_id': particle.id,
-                'particle_type': particle.particle_type.value,
-                'keyframe_idx': i,
-                'x': round(kf.x, 2),
-                'y': round(kf.y, 2),
-                'time_sec': round(kf.time, 4),
-                'duration_to_next': round(duration_to_next, 4),
-                'is_start': i == 0,
-                'is_end': i == len(keyframes) - 1,
-                'collision_id': particle.collision_id
-            })
-    
-    df = pd.DataFrame(rows)
-    
-    # Sort by particle type, particle id, then keyframe index
-    df = df.sort_values(['particle_type', 'particle_id', 'keyframe_idx']).reset_index(drop=True)
-    
-    return df
-
-
-def generate_collision_dataframe(result: SimulationResult) -> pd.DataFrame:
+        columns['particle_id'].append(particle.id)
+        columns['particle_type'].append(particle.particle_type)
+        columns['start_time'].append(particle.start_time)
+        columns['end_time'].append(particle.end_time if particle.end_time else np.nan)
+        columns['start_x'].append(start_pos[0])
+        columns['start_y'].append(start_pos[1])
+        columns['end_x'].append(end_pos[0])
+        columns['end_y'].append(end_pos[1])
+        columns['num_keyframes'].append(end - start)
+        columns['num_bounces'].append(end - start - 2)  # Subtract start and end
+        columns['collision_id'].append(particle.collision_id)
+    
+    # Values are already rounded by Simulation.run (missing values stay NaN)
+    for name in ('start_time', 'end_time', 'start_x', 'start_y', 'end_x', 'end_y'):
+        columns[name] = np.array(columns[name], dtype=np.float64)
+    
+    columns['particle_id'] = np.array(columns['particle_id'], dtype=np.int64)
+    columns['particle_type'] = np.array(columns['particle_type'], dtype=np.int8)
+    columns['num_keyframes'] = np.array(columns['num_keyframes'], dtype=np.int64)
+    columns['num_bounces'] = np.array(columns['num_bounces'], dtype=np.int64)
+    columns['collision_id'] = _optional_ids(columns['collision_id'])
+    
+    return columns
+
+
+def _to_dataframe(columns: Dict[str, np.ndarray]) -> 'pd.DataFrame':
+    """Wrap export columns in a DataFrame; coded columns become categoricals."""
+    import pandas as pd
+    
+    data = dict(columns)
+    for name, labels in _CODED_COLUMNS.items():
+        if name in data:
+            data[name] = pd.Categorical.from_codes(data[name], categories=labels)
+    return pd.DataFrame(data)
+
+
+def generate_keyframe_dataframe(result: SimulationResult) -> 'pd.DataFrame':
     """
-    Generate a DataFrame with collision event data.
+    Generate a DataFrame with all keyframe data for Rive animation.
     
     Args:
         result: SimulationResult from running the simulation
     
     Returns:
-        pandas DataFrame with collision data
+        pandas DataFrame with keyframe data (see _keyframe_columns)
+    """
+    return _to_dataframe(_keyframe_columns(result))
+
+
+def generate_collision_dataframe(result: SimulationResult) -> 'pd.DataFrame':
     """
-    rows = []
+    Generate a DataFrame with collision event data.
     
-    for collision in result.collisions:
-        rows.append({
-            'collision_id': collision.id,
-            'time_sec': round(collision.time, 4),
-            'x': round(collision.x, 2),
-            'y': round(collision.y, 2),
-            'no2_particle_1': collision.particle1_id,
-            'no2_particle_2': collision.particle2_id,
-            'n2o4_particle': collision.result_particle_id
-        })
+    Args:
+        result: SimulationResult from running the simulation
     
-    return pd.DataFrame(rows)
+    Returns:
+        pandas DataFrame with collision data
+    """
+    return _to_dataframe(_collision_columns(result))
 
 
-def generate_particle_summary(result: SimulationResult) -> pd.DataFrame:
+def generate_particle_summary(result: SimulationResult) -> 'pd.DataFrame':
     """
     Generate a summary DataFrame with one row per particle.
     
@@ -96,37 +213,46 @@ def generate_particle_summary(result: SimulationResult) -> pd.DataFrame:
     Returns:
         pandas DataFrame with particle summary
     """
-    rows = []
+    return _to_dataframe(_summary_columns(result))
+
+
+def _format_column(name: str, values: np.ndarray) -> np.ndarray:
+    """Format a column as CSV text the way pandas' to_csv does (NaN -> empty)."""
+    if name in _CODED_COLUMNS:
+        return _CODED_COLUMNS[name][values]
+    if values.dtype.kind == 'f':
+        return np.where(np.isnan(values), '', values.astype(str))
+    return values.astype(str)
+
+
+def _write_csv(path: str, columns: Dict[str, np.ndarray]) -> None:
+    """Write a dict of equal-length column arrays to a CSV file."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(columns.keys())
+        writer.writerows(zip(*(_format_column(name, values) for name, values in columns.items())))
+
+
+def _write_parquet(path: str, columns: Dict[str, np.ndarray]) -> None:
+    """Write a dict of column arrays to a zstd-compressed Parquet file (requires pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
     
-    for particle in result.particles:
-        start_pos = particle.keyframes[0] if particle.keyframes else None
-        end_pos = particle.keyframes[-1] if particle.keyframes else None
-        
-        rows.append({
-            'particle_id': particle.id,
-            'particle_type': particle.particle_type.value,
-            'start_time': round(particle.start_time, 4),
-            'end_time': round(particle.end_time, 4) if particle.end_time else None,
-            'start_x': round(start_pos.x, 2) if start_pos else None,
-            'start_y': round(start_pos.y, 2) if start_pos else None,
-            'end_x': round(end_pos.x, 2) if end_pos else None,
-            'end_y': round(end_pos.y, 2) if end_pos else None,
-            'num_keyframes': len(particle.keyframes),
-            'num_bounces': len(particle.keyframes) - 2,  # Subtract start and end
-            'collision_id': particle.collision_id
-        })
-    
-    df = pd.DataFrame(rows)
-    df = df.sort_values(['particle_type', 'particle_id']).reset_index(drop=True)
-    
-    return df
+    arrays = {}
+    for name, values in columns.items():
+        if name in _CODED_COLUMNS:
+            arrays[name] = pa.DictionaryArray.from_arrays(values, _CODED_COLUMNS[name])
+        else:
+            arrays[name] = pa.array(values, from_pandas=True)
+    pq.write_table(pa.table(arrays), path, compression='zstd')
 
 
 def export_to_csv(
     result: SimulationResult,
     keyframes_path: str = 'particle_keyframes.csv',
     collisions_path: Optional[str] = 'collisions.csv',
-    summary_path: Optional[str] = 'particle_summary.csv'
+    summary_path: Optional[str] = 'particle_summary.csv',
+    parquet_path: Optional[str] = None
 ) -> None:
     """
     Export simulation results to CSV files.
@@ -136,26 +262,30 @@ def export_to_csv(
         keyframes_path: Path for the keyframes CSV
         collisions_path: Path for the collisions CSV (None to skip)
         summary_path: Path for the summary CSV (None to skip)
+        parquet_path: Path for a zstd-compressed Parquet copy of the keyframes
+            (None to skip; requires pyarrow)
     """
     # Export keyframes
-    keyframes_df = generate_keyframe_dataframe(result)
-    keyframes_df.to_csv(keyframes_path, index=False)
+    keyframe_columns = _keyframe_columns(result)
+    _write_csv(keyframes_path, keyframe_columns)
     print(f"Exported keyframes to: {keyframes_path}")
-    print(f"  - Total keyframes: {len(keyframes_df)}")
-    print(f"  - NO2 particles: {len([p for p in result.particles if p.particle_type == ParticleType.NO2])}")
-    print(f"  - N2O4 particles: {len([p for p in result.particles if p.particle_type == ParticleType.N2O4])}")
+    if parquet_path:
+        _write_parquet(parquet_path, keyframe_columns)
+        print(f"Exported keyframes to: {parquet_path}")
+    print(f"  - Total keyframes: {len(keyframe_columns['particle_id'])}")
+    n2o4_count = sum(p.particle_type for p in result.particles)
+    print(f"  - NO2 particles: {len(result.particles) - n2o4_count}")
+    print(f"  - N2O4 particles: {n2o4_count}")
     
     # Export collisions
     if collisions_path:
-        collisions_df = generate_collision_dataframe(result)
-        collisions_df.to_csv(collisions_path, index=False)
+        _write_csv(collisions_path, _collision_columns(result))
         print(f"Exported collisions to: {collisions_path}")
-        print(f"  - Total collisions: {len(collisions_df)}")
+        print(f"  - Total collisions: {len(result.collisions)}")
     
     # Export summary
     if summary_path:
-        summary_df = generate_particle_summary(result)
-        summary_df.to_csv(summary_path, index=False)
+        _write_csv(summary_path, _summary_columns(result))
         print(f"Exported summary to: {summary_path}")
 
 
@@ -176,16 +306,20 @@ def print_keyframes_preview(result: SimulationResult, max_particles: int = 3) ->
         if shown >= max_particles:
             break
         
-        print(f"\n{particle.particle_type.value} Particle {particle.id}")
+        print(f"\n{particle.particle_type.name} Particle {particle.id}")
         print(f"  Active: {particle.start_time:.2f}s - {particle.end_time:.2f}s" 
               if particle.end_time else f"  Active from: {particle.start_time:.2f}s")
-        print(f"  Keyframes ({len(particle.keyframes)}):")
+        num_keyframes = len(particle.keyframes_arr)
+        print(f"  Keyframes ({num_keyframes}):")
         
-        for i, kf in enumerate(particle.keyframes[:5]):  # Show first 5 keyframes
-            print(f"    [{i}] t={kf.time:.3f}s: ({kf.x:.1f}, {kf.y:.1f})")
+        # Show first 5 keyframes, formatted straight from the array in one print
+        rows = particle.keyframes_arr[:5].tolist()
+        print("\n".join(
+            f"    [{i}] t={t:.3f}s: ({x:.1f}, {y:.1f})" for i, (x, y, t) in enumerate(rows)
+        ))
         
-        if len(particle.keyframes) > 5:
-            print(f"    ... and {len(particle.keyframes) - 5} more keyframes")
+        if num_keyframes > 5:
+            print(f"    ... and {num_keyframes - 5} more keyframes")
         
         shown += 1
     
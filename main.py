@@ -54,6 +54,8 @@ Examples:
                         help='Save animation as GIF')
     parser.add_argument('--no-csv', action='store_true',
                         help='Skip CSV export')
+    parser.add_argument('--parquet', type=str, metavar='FILE',
+                        help='Also save keyframes as Parquet (requires pyarrow)')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Print detailed keyframe preview')
     
@@ -116,7 +118,8 @@ Examples:
             result,
             keyframes_path=output_path,
             collisions_path='collisions.csv',
-            summary_path='particle_summary.csv'
+            summary_path='particle_summary.csv',
+            parquet_path=args.parquet
         )
     
     # Print verbose preview
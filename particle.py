@@ -2,19 +2,27 @@
 Particle class to track state and keyframes for NO2 and N2O4 particles.
 """
 
+import bisect
 from dataclasses import dataclass, field
 from typing import List, Optional
-from enum import Enum
+from enum import IntEnum
+
+import numpy as np
 
 from trajectory import Keyframe
 
 
-class ParticleType(Enum):
-    NO2 = "NO2"
-    N2O4 = "N2O4"
+class ParticleType(IntEnum):
+    """Particle species; use .name for the "NO2" / "N2O4" label."""
+    NO2 = 0
+    N2O4 = 1
+
+
+def _empty_keyframes_arr() -> np.ndarray:
+    return np.empty((0, 3))
 
 
-@dataclass
+@dataclass(slots=True)
 class Particle:
     """
     Represents a particle in the simulation.
@@ -22,7 +30,8 @@ class Particle:
     Attributes:
         id: Unique identifier for the particle
         particle_type: Either NO2 or N2O4
-        keyframes: List of keyframes defining the particle's trajectory
+        keyframes_arr: (k, 3) float64 array of (x, y, time) rows defining the
+            particle's trajectory; the keyframes property exposes it as Keyframe objects
         start_time: Time when the particle appears (0 for initial NO2 particles)
         end_time: Time when the particle disappears (collision time for NO2, animation end for others)
         collision_id: ID of the collision this particle is involved in (None if no collision)
@@ -30,51 +39,92 @@ class Particle:
     """
     id: int
     particle_type: ParticleType
-    keyframes: List[Keyframe] = field(default_factory=list)
+    keyframes_arr: np.ndarray = field(default_factory=_empty_keyframes_arr, compare=False)
     start_time: float = 0.0
     end_time: Optional[float] = None
     collision_id: Optional[int] = None
     velocity: tuple = (0.0, 0.0)
+    _keyframes: Optional[List[Keyframe]] = field(default=None, init=False, repr=False, compare=False)
+    _kf_t: Optional[List[float]] = field(default=None, init=False, repr=False, compare=False)
+    _kf_x: Optional[List[float]] = field(default=None, init=False, repr=False, compare=False)
+    _kf_y: Optional[List[float]] = field(default=None, init=False, repr=False, compare=False)
+    _last_kf_idx: int = field(default=0, init=False, repr=False, compare=False)
+    
+    @property
+    def keyframes(self) -> List[Keyframe]:
+        """Keyframes as Keyframe objects, built from keyframes_arr on first access."""
+        if self._keyframes is None:
+            self._keyframes = [Keyframe(x=x, y=y, time=t) for x, y, t in self.keyframes_arr.tolist()]
+        return self._keyframes
+    
+    @property
+    def keyframe_times(self) -> List[float]:
+        """Keyframe times in order, built from keyframes_arr on first access."""
+        if self._kf_t is None:
+            self._unpack_keyframes()
+        return self._kf_t
+    
+    def _unpack_keyframes(self) -> None:
+        """Split keyframes_arr into parallel x / y / time lists for scalar lookups."""
+        self._kf_x, self._kf_y, self._kf_t = self.keyframes_arr.T.tolist()
+    
+    def _clear_keyframe_cache(self) -> None:
+        """Drop everything derived from keyframes_arr after it changes."""
+        self._keyframes = None
+        self._kf_t = self._kf_x = self._kf_y = None
+        self._last_kf_idx = 0
     
     def add_keyframe(self, x: float, y: float, time: float) -> None:
         """Add a keyframe to the particle's trajectory."""
-        self.keyframes.append(Keyframe(x=x, y=y, time=time))
+        self.keyframes_arr = np.vstack([self.keyframes_arr, [(x, y, time)]])
+        self._clear_keyframe_cache()
     
     def set_keyframes(self, keyframes: List[Keyframe]) -> None:
         """Set the complete list of keyframes."""
-        self.keyframes = keyframes
+        self.keyframes_arr = np.array(
+            [(kf.x, kf.y, kf.time) for kf in keyframes], dtype=np.float64
+        ).reshape(-1, 3)
+        self._clear_keyframe_cache()
     
     def get_position_at_time(self, time: float) -> Optional[tuple]:
         """
         Get interpolated position at a specific time.
         Returns None if time is outside the particle's lifespan.
         """
-        if not self.keyframes:
+        if not len(self.keyframes_arr):
             return None
         
         if time < self.start_time or (self.end_time is not None and time > self.end_time):
             return None
         
-        # Find the keyframes surrounding this time
-        for i in range(len(self.keyframes) - 1):
-            kf1 = self.keyframes[i]
-            kf2 = self.keyframes[i + 1]
+        # Playback moves forward in time, so try the last segment used (or
+        # the one after it) before falling back to a binary search
+        times = self.keyframe_times
+        last_segment = len(times) - 2
+        i = self._last_kf_idx
+        if i < last_segment and time > times[i + 1]:
+            i += 1
+        if not (0 <= i <= last_segment and times[i] <= time <= times[i + 1]):
+            i = min(bisect.bisect_right(times, time) - 1, last_segment)
+        
+        if i >= 0 and time <= times[i + 1]:
+            self._last_kf_idx = i
+            xs, ys = self._kf_x, self._kf_y
+            t1, t2 = times[i], times[i + 1]
             
-            if kf1.time <= time <= kf2.time:
-                # Linear interpolation
-                if kf2.time == kf1.time:
-                    return (kf1.x, kf1.y)
-                
-                t = (time - kf1.time) / (kf2.time - kf1.time)
-                x = kf1.x + t * (kf2.x - kf1.x)
-                y = kf1.y + t * (kf2.y - kf1.y)
-                return (x, y)
+            # Linear interpolation
+            if t2 == t1:
+                return (xs[i], ys[i])
+            
+            t = (time - t1) / (t2 - t1)
+            x = xs[i] + t * (xs[i + 1] - xs[i])
+            y = ys[i] + t * (ys[i + 1] - ys[i])
+            return (x, y)
         
         # Return last position if at end
-        if self.keyframes:
-            last = self.keyframes[-1]
-            if abs(time - last.time) < 1e-6:
-                return (last.x, last.y)
+        if abs(time - times[-1]) < 1e-6:
+            xs, ys = self._kf_x, self._kf_y
+            return (xs[-1], ys[-1])
         
         return None
     
@@ -90,8 +140,20 @@ class Particle:
         """Get the velocity at the end of the trajectory (for N2O4 creation)."""
         return self.velocity
     
+    def __eq__(self, other) -> bool:
+        # keyframes_arr is an ndarray, so it can't go through the generated tuple comparison
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (
+            (self.id, self.particle_type, self.start_time, self.end_time,
+             self.collision_id, self.velocity)
+            == (other.id, other.particle_type, other.start_time, other.end_time,
+                other.collision_id, other.velocity)
+            and np.array_equal(self.keyframes_arr, other.keyframes_arr)
+        )
+    
     def __repr__(self) -> str:
-        return f"Particle({self.id}, {self.particle_type.value}, keyframes={len(self.keyframes)})"
+        return f"Particle({self.id}, {self.particle_type.name}, keyframes={len(self.keyframes_arr)})"
 
 
 @dataclass 
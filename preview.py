@@ -6,12 +6,15 @@ Visualizes particles moving, bouncing, and colliding.
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+from matplotlib.lines import Line2D
 from matplotlib.patches import Circle, Rectangle
-from matplotlib.collections import PatchCollection
+from matplotlib.collections import EllipseCollection, LineCollection, PatchCollection
+from matplotlib.colors import to_rgba_array
 from typing import List, Optional, Tuple
 
 from simulation import SimulationResult
 from particle import Particle, ParticleType
+from _trajectory_numba import HAVE_NUMBA, _interpolate_frames
 import config
 
 
@@ -20,6 +23,9 @@ class SimulationPreview:
     Creates an animated preview of the particle simulation using matplotlib.
     """
     
+    # Number of recent positions drawn in each particle's trail
+    TRAIL_LENGTH = 30
+    
     def __init__(
         self,
         result: SimulationResult,
@@ -54,9 +60,11 @@ class SimulationPreview:
         self.fig, self.ax = plt.subplots(figsize=(8, 8))
         self._setup_axes()
         
+        # Keyframe lookup tables for vectorized position updates
+        self._build_keyframe_tables()
+        
         # Create particle artists
-        self.particle_artists = {}
-        self.trail_artists = {} if show_trails else None
+        self.trails_artist = None
         self._create_artists()
         
         # Time display
@@ -69,8 +77,21 @@ class SimulationPreview:
             bbox=dict(boxstyle='round', facecolor='white', alpha=0.8)
         )
         
-        # Collision flash markers
+        # Collision flash markers, one reusable circle per collision
         self.collision_markers = []
+        for collision in result.collisions:
+            flash = Circle(
+                (collision.x, collision.y),
+                self.particle_radius * 3,
+                color='yellow',
+                visible=False
+            )
+            self.ax.add_patch(flash)
+            self.collision_markers.append(flash)
+        
+        # Per-frame particle positions, filled by _precompute_frames
+        self._frame_xy = None
+        self._frame_visible = None
         
         self.anim = None
     
@@ -100,33 +121,139 @@ class SimulationPreview:
         # Grid
         self.ax.grid(True, alpha=0.3)
     
+    def _build_keyframe_tables(self) -> None:
+        """
+        Pack every particle's keyframes into padded (P, K) float32 arrays.
+        
+        Rows follow result.particles. Times past a particle's last keyframe
+        are padded with inf and positions with the last keyframe, so one
+        comparison per row finds the current segment for all particles.
+        """
+        result = self.result
+        particles = result.particles
+        num_keyframes = np.diff(result.kf_offset).astype(np.intp)
+        width = max(2, int(num_keyframes.max(initial=0)))
+        
+        # Table cell of every packed keyframe
+        rows = np.repeat(np.arange(len(particles)), num_keyframes)
+        cols = np.arange(len(result.kf_time)) - np.repeat(result.kf_offset[:-1], num_keyframes)
+        
+        # Start each row as its last keyframe repeated, then fill in the rest
+        # (rows without keyframes point at an extra padding entry)
+        last = np.where(num_keyframes > 0, result.kf_offset[1:] - 1, len(result.kf_time))
+        padded_xy = np.vstack([result.kf_xy, np.zeros((1, 2))]).astype(np.float32)
+        self._kf_x = np.repeat(padded_xy[last, 0][:, None], width, axis=1)
+        self._kf_y = np.repeat(padded_xy[last, 1][:, None], width, axis=1)
+        self._kf_t = np.full((len(particles), width), np.inf, dtype=np.float32)
+        self._kf_x[rows, cols] = result.kf_xy[:, 0]
+        self._kf_y[rows, cols] = result.kf_xy[:, 1]
+        self._kf_t[rows, cols] = result.kf_time
+        
+        self._num_keyframes = num_keyframes
+        self._first_t = self._kf_t[:, 0].copy()
+        self._last_t = np.append(result.kf_time, -np.inf).astype(np.float32)[last]
+        self._start = np.array([p.start_time for p in particles], dtype=np.float32)
+        self._end = np.array(
+            [np.inf if p.end_time is None else p.end_time for p in particles], dtype=np.float32
+        )
+    
+    def _positions_at(self, time: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Interpolate every particle's position at a time in one vectorized pass.
+        
+        Matches Particle.get_position_at_time row by row.
+        
+        Args:
+            time: Simulation time in seconds
+        
+        Returns:
+            Tuple of (xs, ys, visible) arrays in result.particles order;
+            visible is False where the particle has no position at this time
+        """
+        # Stay in float32 like the tables (pixels and seconds need no more)
+        time = np.float32(time)
+        
+        # Segment index: last keyframe at or before time, kept inside each row
+        idx = (self._kf_t <= time).sum(axis=1) - 1
+        idx = np.clip(idx, 0, np.maximum(self._num_keyframes - 2, 0))[:, None]
+        
+        t0 = np.take_along_axis(self._kf_t, idx, axis=1)[:, 0]
+        t1 = np.take_along_axis(self._kf_t, idx + 1, axis=1)[:, 0]
+        x0 = np.take_along_axis(self._kf_x, idx, axis=1)[:, 0]
+        x1 = np.take_along_axis(self._kf_x, idx + 1, axis=1)[:, 0]
+        y0 = np.take_along_axis(self._kf_y, idx, axis=1)[:, 0]
+        y1 = np.take_along_axis(self._kf_y, idx + 1, axis=1)[:, 0]
+        
+        # Linear interpolation (equal-time or padded segments hold the first keyframe)
+        span = t1 - t0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where((span > 0) & np.isfinite(span), (time - t0) / span, 0.0)
+        frac = np.minimum(frac, 1.0)
+        xs = x0 + frac * (x1 - x0)
+        ys = y0 + frac * (y1 - y0)
+        
+        visible = (
+            (self._start <= time) & (time <= self._end)
+            & (self._first_t <= time) & (time <= self._last_t + 1e-6)
+        )
+        return xs, ys, visible
+    
+    def _precompute_frames(self) -> None:
+        """Interpolate every particle's position for every frame up front."""
+        num_particles = len(self.result.particles)
+        self._frame_xy = np.empty((self.total_frames, num_particles, 2), dtype=np.float32)
+        self._frame_visible = np.empty((self.total_frames, num_particles), dtype=bool)
+        
+        if HAVE_NUMBA:
+            # One compiled pass over every frame
+            frame_times = (np.arange(self.total_frames) / self.fps).astype(np.float32)
+            _interpolate_frames(
+                self._kf_t, self._kf_x, self._kf_y, self._num_keyframes,
+                self._start, self._end, self._first_t, self._last_t + 1e-6,
+                frame_times, self._frame_xy, self._frame_visible
+            )
+            return
+        
+        # Without numba, look up each frame with NumPy
+        for frame in range(self.total_frames):
+            xs, ys, visible = self._positions_at(self._get_frame_time(frame))
+            self._frame_xy[frame, :, 0] = xs
+            self._frame_xy[frame, :, 1] = ys
+            self._frame_visible[frame] = visible
+    
     def _create_artists(self) -> None:
-        """Create matplotlib artists for each particle."""
-        for particle in self.result.particles:
-            color = self.no2_color if particle.particle_type == ParticleType.NO2 else self.n2o4_color
-            
-            # Main particle circle
-            circle = Circle(
-                (0, 0),
-                self.particle_radius,
-                color=color,
-                alpha=0.8,
-                visible=False
+        """Create one collection drawing every particle, plus one for trails."""
+        colors = [
+            self.no2_color if particle.particle_type == ParticleType.NO2 else self.n2o4_color
+            for particle in self.result.particles
+        ]
+        
+        # Particle circles; hidden particles get a fully transparent color
+        num_particles = len(self.result.particles)
+        self._particle_colors = to_rgba_array(colors, alpha=0.8) if colors else np.zeros((0, 4))
+        self._frame_colors = self._particle_colors.copy()
+        diameter = 2 * self.particle_radius
+        self.particles_artist = EllipseCollection(
+            widths=np.full(num_particles, diameter),
+            heights=np.full(num_particles, diameter),
+            angles=np.zeros(num_particles),
+            units='xy',
+            offsets=np.zeros((num_particles, 2)),
+            offset_transform=self.ax.transData,
+            facecolors=np.zeros((num_particles, 4)),
+            edgecolors=np.zeros((num_particles, 4))
+        )
+        self.ax.add_collection(self.particles_artist, autolim=False)
+        
+        # Trails (if enabled): one collection fed from a buffer holding each
+        # particle's last TRAIL_LENGTH positions, newest last
+        if self.show_trails:
+            self._trail_buf = np.zeros((num_particles, self.TRAIL_LENGTH, 2), dtype=np.float32)
+            self._trail_len = np.zeros(num_particles, dtype=np.intp)
+            self.trails_artist = LineCollection(
+                [np.empty((0, 2))] * num_particles, colors=colors, alpha=0.3, linewidths=1
             )
-            self.ax.add_patch(circle)
-            self.particle_artists[particle.id] = {
-                'circle': circle,
-                'particle': particle,
-                'type': particle.particle_type
-            }
-            
-            # Trail (if enabled)
-            if self.show_trails:
-                trail_line, = self.ax.plot([], [], color=color, alpha=0.3, linewidth=1)
-                self.trail_artists[particle.id] = {
-                    'line': trail_line,
-                    'positions': []
-                }
+            self.ax.add_collection(self.trails_artist, autolim=False)
     
     def _get_frame_time(self, frame: int) -> float:
         """Convert frame number to simulation time."""
@@ -141,83 +268,66 @@ class SimulationPreview:
         
         artists = [self.time_text]
         
-        # Check for collisions at this time (for visual effect)
-        for collision in self.result.collisions:
-            # Show flash near collision time
+        # Show a fading flash near each collision time (for visual effect)
+        for collision, flash in zip(self.result.collisions, self.collision_markers):
             if abs(current_time - collision.time) < 0.1:
-                # Create a flash effect
                 alpha = 1 - abs(current_time - collision.time) / 0.1
-                flash = Circle(
-                    (collision.x, collision.y),
-                    self.particle_radius * 3,
-                    color='yellow',
-                    alpha=alpha * 0.5,
-                    visible=True
-                )
-                self.ax.add_patch(flash)
-                self.collision_markers.append(flash)
-        
-        # Clean up old collision markers
-        for marker in self.collision_markers[:]:
-            if marker.get_alpha() is not None and marker.get_alpha() < 0.05:
-                marker.remove()
-                self.collision_markers.remove(marker)
-        
-        # Update each particle
-        for particle_id, artist_info in self.particle_artists.items():
-            particle = artist_info['particle']
-            circle = artist_info['circle']
-            
-            # Check if particle is active at this time
-            if particle.is_active_at_time(current_time):
-                pos = particle.get_position_at_time(current_time)
-                if pos:
-                    circle.center = pos
-                    circle.set_visible(True)
-                    
-                    # Update trail if enabled
-                    if self.show_trails and particle_id in self.trail_artists:
-                        trail_info = self.trail_artists[particle_id]
-                        trail_info['positions'].append(pos)
-                        # Keep only last N positions
-                        if len(trail_info['positions']) > 30:
-                            trail_info['positions'] = trail_info['positions'][-30:]
-                        
-                        if trail_info['positions']:
-                            xs, ys = zip(*trail_info['positions'])
-                            trail_info['line'].set_data(xs, ys)
-                else:
-                    circle.set_visible(False)
+                flash.set_alpha(alpha * 0.5)
+                flash.set_visible(True)
             else:
-                circle.set_visible(False)
-                
-                # Clear trail when particle disappears
-                if self.show_trails and particle_id in self.trail_artists:
-                    if not particle.is_active_at_time(current_time):
-                        self.trail_artists[particle_id]['positions'] = []
-                        self.trail_artists[particle_id]['line'].set_data([], [])
-            
-            artists.append(circle)
+                flash.set_visible(False)
+        
+        # Update every particle from the precomputed frame positions
+        if self._frame_xy is None:
+            self._precompute_frames()
+        xy = self._frame_xy[frame]
+        visible = self._frame_visible[frame]
+        self.particles_artist.set_offsets(xy)
+        self._frame_colors[:, 3] = np.where(visible, self._particle_colors[:, 3], 0.0)
+        self.particles_artist.set_facecolors(self._frame_colors)
+        self.particles_artist.set_edgecolors(self._frame_colors)
+        artists.append(self.particles_artist)
+        
+        # Update trails if enabled: visible particles shift in their newest
+        # position, particles that no longer exist lose their trail
+        if self.show_trails:
+            self._trail_buf[visible, :-1] = self._trail_buf[visible, 1:]
+            self._trail_buf[visible, -1] = xy[visible]
+            self._trail_len[visible] = np.minimum(self._trail_len[visible] + 1, self.TRAIL_LENGTH)
+            self._trail_len[(current_time < self._start) | (current_time > self._end)] = 0
+            self.trails_artist.set_segments([
+                trail[self.TRAIL_LENGTH - length:]
+                for trail, length in zip(self._trail_buf, self._trail_len.tolist())
+            ])
+            artists.append(self.trails_artist)
         
+        artists.extend(self.collision_markers)
         return artists
     
     def _init_animation(self) -> List:
         """Initialize animation."""
-        artists = [self.time_text]
-        for artist_info in self.particle_artists.values():
-            artist_info['circle'].set_visible(False)
-            artists.append(artist_info['circle'])
+        self._frame_colors[:, 3] = 0.0
+        self.particles_artist.set_facecolors(self._frame_colors)
+        self.particles_artist.set_edgecolors(self._frame_colors)
+        for flash in self.collision_markers:
+            flash.set_visible(False)
+        artists = [self.time_text, self.particles_artist, *self.collision_markers]
+        if self.show_trails:
+            self._trail_len[:] = 0
+            self.trails_artist.set_segments([np.empty((0, 2))] * len(self._trail_len))
+            artists.append(self.trails_artist)
         return artists
     
     def create_animation(self) -> animation.FuncAnimation:
         """Create and return the animation object."""
+        self._precompute_frames()
         self.anim = animation.FuncAnimation(
             self.fig,
             self._update_frame,
             init_func=self._init_animation,
             frames=self.total_frames,
             interval=1000 / self.fps,
-            blit=False  # Set to False for better compatibility
+            blit=True  # Only the artists returned by _update_frame are redrawn
         )
         return self.anim
     
@@ -275,14 +385,14 @@ def create_static_trajectory_plot(result: SimulationResult) -> plt.Figure:
     no2_cmap = plt.cm.Reds
     n2o4_cmap = plt.cm.Blues
     
-    # Plot trajectories
+    # Collect every trajectory so each kind of mark is drawn as one collection
+    offsets = result.kf_offset.tolist()
+    segments, colors, legend_handles = [], [], []
     for i, particle in enumerate(result.particles):
-        if not particle.keyframes:
+        start, end = offsets[i], offsets[i + 1]
+        if start == end:
             continue
         
-        xs = [kf.x for kf in particle.keyframes]
-        ys = [kf.y for kf in particle.keyframes]
-        
         if particle.particle_type == ParticleType.NO2:
             color = no2_cmap(0.3 + 0.5 * (particle.id / result.collisions[-1].particle2_id if result.collisions else 1))
             label = f'NO2 #{particle.id}'
@@ -290,19 +400,27 @@ def create_static_trajectory_plot(result: SimulationResult) -> plt.Figure:
             color = n2o4_cmap(0.3 + 0.5 * ((particle.id - 15) / len(result.collisions) if result.collisions else 1))
             label = f'N2O4 #{particle.id}'
         
-        # Plot trajectory line
-        ax.plot(xs, ys, '-', color=color, alpha=0.6, linewidth=1.5, label=label if i < 10 else None)
-        
-        # Mark start position
-        ax.plot(xs[0], ys[0], 'o', color=color, markersize=8)
+        segments.append(result.kf_xy[start:end])
+        colors.append(color)
+        if i < 10:
+            legend_handles.append(Line2D([], [], color=color, alpha=0.6, linewidth=1.5, label=label))
+    
+    if segments:
+        # Trajectory lines
+        ax.add_collection(LineCollection(segments, colors=colors, alpha=0.6, linewidths=1.5, zorder=2))
         
-        # Mark end position
-        ax.plot(xs[-1], ys[-1], 's', color=color, markersize=6)
+        # Start (circle) and end (square) positions
+        starts = np.array([segment[0] for segment in segments])
+        ends = np.array([segment[-1] for segment in segments])
+        ax.scatter(starts[:, 0], starts[:, 1], s=8 ** 2, c=colors, marker='o', linewidths=1, zorder=2)
+        ax.scatter(ends[:, 0], ends[:, 1], s=6 ** 2, c=colors, marker='s', linewidths=1, zorder=2)
     
     # Mark collision points
+    if result.collisions:
+        ax.scatter([c.x for c in result.collisions], [c.y for c in result.collisions],
+                   s=15 ** 2, marker='*', color='gold',
+                   edgecolors='orange', linewidths=1, zorder=10)
     for collision in result.collisions:
-        ax.plot(collision.x, collision.y, '*', color='gold', markersize=15, 
-                markeredgecolor='orange', markeredgewidth=1, zorder=10)
         ax.annotate(f't={collision.time:.1f}s', 
                    (collision.x, collision.y), 
                    xytext=(5, 5), textcoords='offset points',
@@ -315,7 +433,7 @@ def create_static_trajectory_plot(result: SimulationResult) -> plt.Figure:
     ax.grid(True, alpha=0.3)
     
     # Legend
-    ax.legend(loc='upper left', fontsize=8, ncol=2)
+    ax.legend(handles=legend_handles, loc='upper left', fontsize=8, ncol=2)
     
     plt.tight_layout()
     return fig
@@ -5,46 +5,96 @@ Coordinates collision scheduling and trajectory generation for all particles.
 
 import numpy as np
 from typing import List, Dict, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from particle import Particle, ParticleType, Collision
+from trajectory import max_keyframes
+from trajectory_batch import trace_trajectories
 from collision_scheduler import (
     schedule_collisions,
-    create_colliding_particles,
-    create_non_colliding_particle,
+    precompute_collision_velocities,
+    plan_collision_paths,
+    plan_non_colliding_path,
+    build_colliding_particles,
+    build_non_colliding_particle,
     CollisionSchedule
 )
 
 
 @dataclass
 class SimulationResult:
-    """Contains all simulation outputs."""
+    """
+    Contains all simulation outputs.
+    
+    Every keyframe lives in one packed (K, 3) float64 store, kf_packed, of
+    (x, y, time) rows in result.particles order: particle i's keyframes are
+    rows kf_offset[i]:kf_offset[i + 1] and its keyframes_arr is a view of
+    them. kf_time and kf_xy are column views of the same store, so in-place
+    edits show up everywhere. The store and the id / type indexes are
+    built once: after changing result.particles or calling add_keyframe /
+    set_keyframes (which give a particle a new array outside the store),
+    call refresh().
+    """
     particles: List[Particle]
     collisions: List[Collision]
     animation_duration: float
     container_width: float
     container_height: float
+    kf_packed: np.ndarray = field(init=False, repr=False, compare=False)
+    kf_offset: np.ndarray = field(init=False, repr=False, compare=False)
+    kf_time: np.ndarray = field(init=False, repr=False, compare=False)
+    kf_xy: np.ndarray = field(init=False, repr=False, compare=False)
+    _by_id: Dict[int, Particle] = field(init=False, repr=False, compare=False)
+    _no2: List[Particle] = field(init=False, repr=False, compare=False)
+    _n2o4: List[Particle] = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self) -> None:
+        self.refresh()
+    
+    def refresh(self) -> None:
+        """Rebuild the particle indexes and the packed keyframe store from result.particles."""
+        # Lookup indexes over particles
+        self._by_id = {p.id: p for p in reversed(self.particles)}  # first match wins
+        self._no2 = [p for p in self.particles if p.particle_type == ParticleType.NO2]
+        self._n2o4 = [p for p in self.particles if p.particle_type == ParticleType.N2O4]
+        
+        # Repack every particle's keyframes and re-point them at the store
+        counts = [len(p.keyframes_arr) for p in self.particles]
+        self.kf_packed = np.concatenate(
+            [p.keyframes_arr for p in self.particles] + [np.empty((0, 3))]
+        )
+        self.kf_offset = np.zeros(len(counts) + 1, dtype=np.int32)
+        np.cumsum(counts, out=self.kf_offset[1:])
+        offsets = self.kf_offset.tolist()
+        for i, particle in enumerate(self.particles):
+            # Same values, so the particle's derived caches stay valid
+            particle.keyframes_arr = self.kf_packed[offsets[i]:offsets[i + 1]]
+        self.kf_time = self.kf_packed[:, 2]
+        self.kf_xy = self.kf_packed[:, :2]
     
     def get_particle_by_id(self, particle_id: int) -> Optional[Particle]:
         """Get a particle by its ID."""
-        for p in self.particles:
-            if p.id == particle_id:
-                return p
-        return None
+        return self._by_id.get(particle_id)
     
     def get_no2_particles(self) -> List[Particle]:
         """Get all NO2 particles."""
-        return [p for p in self.particles if p.particle_type == ParticleType.NO2]
+        return list(self._no2)
     
     def get_n2o4_particles(self) -> List[Particle]:
         """Get all N2O4 particles."""
-        return [p for p in self.particles if p.particle_type == ParticleType.N2O4]
+        return list(self._n2o4)
     
     def get_active_particles_at_time(self, time: float) -> List[Particle]:
         """Get all particles that are active at the given time."""
         return [p for p in self.particles if p.is_active_at_time(time)]
 
 
+def round_keyframes(keyframes_arr: np.ndarray) -> None:
+    """Round (..., 3) keyframe rows in place: x / y to 2 decimals, time to 4 (as exported)."""
+    np.round(keyframes_arr[..., :2], 2, out=keyframes_arr[..., :2])
+    np.round(keyframes_arr[..., 2], 4, out=keyframes_arr[..., 2])
+
+
 class Simulation:
     """
     Main simulation class that orchestrates the entire particle simulation.
@@ -100,6 +150,7 @@ class Simulation:
         # Set random seed if provided
         if self.random_seed is not None:
             np.random.seed(self.random_seed)
+        rng = np.random.default_rng(self.random_seed)
         
         # Schedule collisions
         schedule = schedule_collisions(
@@ -108,7 +159,8 @@ class Simulation:
             animation_duration=self.animation_duration,
             container_width=self.container_width,
             container_height=self.container_height,
-            collision_margin=self.collision_margin
+            collision_margin=self.collision_margin,
+            rng=rng
         )
         
         particles: List[Particle] = []
@@ -117,37 +169,100 @@ class Simulation:
         # N2O4 particles get IDs starting after the last NO2 particle
         next_n2o4_id = self.num_particles + 1
         
-        # Create particles for each collision
-        for collision in schedule.collisions:
-            p1, p2, n2o4 = create_colliding_particles(
-                collision=collision,
-                speed=self.particle_speed,
-                container_width=self.container_width,
-                container_height=self.container_height,
-                next_n2o4_id=next_n2o4_id,
-                animation_duration=self.animation_duration
+        # One preallocated keyframe buffer for every trajectory: rows 3i..3i+2
+        # hold collision i's particles, the rest the non-colliding particles.
+        # Each particle's keyframes_arr is a view into its row. Zero-filled so
+        # the unused tail of each row is safe to round along with the rest.
+        num_trajectories = 3 * len(schedule.collisions) + len(schedule.non_colliding_particle_ids)
+        keyframe_buffer = np.zeros((
+            num_trajectories,
+            max_keyframes(self.particle_speed, self.animation_duration,
+                          self.container_width, self.container_height),
+            3
+        ))
+        
+        # Incoming velocities for every collision pair, drawn up front
+        vx1, vy1, vx2, vy2 = precompute_collision_velocities(
+            n=len(schedule.collisions),
+            speed=self.particle_speed,
+            rng=rng
+        )
+        
+        # Plan every trajectory in buffer row order
+        paths = []
+        collision_velocities = []
+        for i, collision in enumerate(schedule.collisions):
+            incoming = ((float(vx1[i]), float(vy1[i])), (float(vx2[i]), float(vy2[i])))
+            collision_paths, n2o4_velocity = plan_collision_paths(
+                collision, self.particle_speed, self.animation_duration,
+                *incoming[0], *incoming[1]
+            )
+            paths.extend(collision_paths)
+            collision_velocities.append((*incoming, n2o4_velocity))
+        
+        non_colliding_velocities = []
+        for _ in schedule.non_colliding_particle_ids:
+            path, velocity = plan_non_colliding_path(
+                self.particle_speed, self.animation_duration,
+                self.container_width, self.container_height
             )
+            paths.append(path)
+            non_colliding_velocities.append(velocity)
+        
+        # Trace every trajectory in one batch
+        trajectories = trace_trajectories(
+            keyframe_buffer,
+            *np.array(paths, dtype=np.float64).reshape(-1, 6).T,
+            float(self.container_width), float(self.container_height)
+        )
+        
+        # Create particles for each collision
+        for i, collision in enumerate(schedule.collisions):
+            particles.extend(build_colliding_particles(
+                collision, next_n2o4_id, self.animation_duration,
+                collision_velocities[i], tuple(trajectories[3 * i:3 * i + 3])
+            ))
             
             # Update collision with N2O4 particle ID
             collision.result_particle_id = next_n2o4_id
             
-            particles.extend([p1, p2, n2o4])
             collisions.append(collision)
             next_n2o4_id += 1
         
         # Create non-colliding particles
-        for particle_id in schedule.non_colliding_particle_ids:
-            particle = create_non_colliding_particle(
-                particle_id=particle_id,
-                speed=self.particle_speed,
-                animation_duration=self.animation_duration,
-                container_width=self.container_width,
-                container_height=self.container_height
-            )
-            particles.append(particle)
+        first_row = 3 * len(schedule.collisions)
+        for j, particle_id in enumerate(schedule.non_colliding_particle_ids):
+            particles.append(build_non_colliding_particle(
+                particle_id, self.animation_duration,
+                non_colliding_velocities[j], trajectories[first_row + j]
+            ))
+        
+        # Round all output once so consumers read final values: keyframes in
+        # place on the shared buffer, then lifespans and collisions the same
+        # way so they keep matching the keyframes exactly
+        round_keyframes(keyframe_buffer)
+        for particle in particles:
+            # Trajectories that outgrew their buffer row live in their own array
+            if particle.keyframes_arr.base is not keyframe_buffer:
+                round_keyframes(particle.keyframes_arr)
+        
+        # One np.round per array rather than per value
+        lifespans = np.array([
+            (p.start_time, np.nan if p.end_time is None else p.end_time) for p in particles
+        ]).reshape(-1, 2)
+        for particle, (start_time, end_time) in zip(particles, np.round(lifespans, 4).tolist()):
+            particle.start_time = start_time
+            if particle.end_time is not None:
+                particle.end_time = end_time
+        
+        # Collision points are (x, y, time) rows, rounded like keyframes
+        collision_points = np.array([(c.x, c.y, c.time) for c in collisions]).reshape(-1, 3)
+        round_keyframes(collision_points)
+        for collision, (x, y, time) in zip(collisions, collision_points.tolist()):
+            collision.x, collision.y, collision.time = x, y, time
         
         # Sort particles by ID for consistent output
-        particles.sort(key=lambda p: (p.particle_type.value, p.id))
+        particles.sort(key=lambda p: (p.particle_type.name, p.id))
         
         return SimulationResult(
             particles=particles,
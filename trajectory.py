@@ -3,12 +3,15 @@ Trajectory calculation module with wall bounce logic.
 Handles both forward and backward trajectory computation.
 """
 
+import math
 import numpy as np
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
+from _trajectory_numba import _time_to_wall, _trace_into
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class Keyframe:
     """Represents a single keyframe in a particle's trajectory."""
     x: float
@@ -18,7 +21,7 @@ class Keyframe:
 
 def normalize_velocity(vx: float, vy: float, speed: float) -> Tuple[float, float]:
     """Normalize velocity vector to have the specified speed magnitude."""
-    magnitude = np.sqrt(vx**2 + vy**2)
+    magnitude = math.sqrt(vx * vx + vy * vy)
     if magnitude == 0:
         # Default to diagonal direction if zero velocity
         angle = np.random.uniform(0, 2 * np.pi)
@@ -28,8 +31,15 @@ def normalize_velocity(vx: float, vy: float, speed: float) -> Tuple[float, float
 
 def random_velocity(speed: float) -> Tuple[float, float]:
     """Generate a random velocity vector with the given speed magnitude."""
-    angle = np.random.uniform(0, 2 * np.pi)
-    return speed * np.cos(angle), speed * np.sin(angle)
+    # Rejection-sample a point in the unit disc; its direction is uniform
+    # and scaling it needs no sin / cos
+    while True:
+        u, v = np.random.random(2).tolist()
+        u, v = 2.0 * u - 1.0, 2.0 * v - 1.0
+        r2 = u * u + v * v
+        if 0.0 < r2 <= 1.0:
+            scale = speed / math.sqrt(r2)
+            return u * scale, v * scale
 
 
 def calculate_time_to_wall(
@@ -43,35 +53,14 @@ def calculate_time_to_wall(
     Returns:
         Tuple of (time_to_wall, wall_hit) where wall_hit is 'left', 'right', 'top', or 'bottom'
     """
-    times = []
-    
-    # Time to hit left wall (x = 0)
-    if vx < 0:
-        t = -x / vx
-        times.append((t, 'left'))
-    
-    # Time to hit right wall (x = width)
-    if vx > 0:
-        t = (width - x) / vx
-        times.append((t, 'right'))
-    
-    # Time to hit bottom wall (y = 0)
-    if vy < 0:
-        t = -y / vy
-        times.append((t, 'bottom'))
-    
-    # Time to hit top wall (y = height)
-    if vy > 0:
-        t = (height - y) / vy
-        times.append((t, 'top'))
-    
-    # Return the smallest positive time
-    valid_times = [(t, wall) for t, wall in times if t > 1e-10]
-    if not valid_times:
+    # Same wall search as the trajectory kernel
+    time_to_wall, hit_x = _time_to_wall(x, y, vx, vy, width, height)
+    if time_to_wall == math.inf:
         # Particle is stationary or at corner, return large time
         return float('inf'), 'none'
-    
-    return min(valid_times, key=lambda x: x[0])
+    if hit_x:
+        return time_to_wall, 'left' if vx < 0 else 'right'
+    return time_to_wall, 'bottom' if vy < 0 else 'top'
 
 
 def reflect_velocity(vx: float, vy: float, wall: str) -> Tuple[float, float]:
@@ -83,6 +72,99 @@ def reflect_velocity(vx: float, vy: float, wall: str) -> Tuple[float, float]:
     return vx, vy
 
 
+def max_keyframes(speed: float, duration: float, width: float, height: float) -> int:
+    """
+    Upper bound on keyframes for one trajectory lasting `duration` seconds.
+    
+    A particle can hit each pair of walls at most once per container
+    crossing, plus the start and end keyframes.
+    """
+    capacity = 4
+    if width > 0:
+        capacity += int(speed * duration / width)
+    if height > 0:
+        capacity += int(speed * duration / height)
+    return capacity
+
+
+def _trace_trajectory(
+    x: float, y: float, vx: float, vy: float,
+    from_time: float, to_time: float,
+    width: float, height: float,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Run _trace_into and return the filled rows.
+    
+    Writes into `out` (returning a view of it) when given and large enough,
+    otherwise into a freshly allocated array.
+    """
+    if out is not None:
+        n = _trace_into(out, x, y, vx, vy, from_time, to_time, width, height)
+        if n >= 0:
+            return out[:n]
+    
+    speed = math.sqrt(vx * vx + vy * vy)
+    capacity = max_keyframes(speed, abs(to_time - from_time), width, height)
+    while True:
+        buffer = np.empty((capacity, 3))
+        n = _trace_into(buffer, x, y, vx, vy, from_time, to_time, width, height)
+        if n >= 0:
+            return buffer[:n]
+        capacity *= 2
+
+
+def forward_trajectory_array(
+    start_x: float, start_y: float,
+    vx: float, vy: float,
+    start_time: float, end_time: float,
+    width: float, height: float,
+    speed: float,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Calculate forward trajectory as an (k, 3) array of (x, y, time) rows.
+    
+    Same path as calculate_forward_trajectory without building Keyframe
+    objects. If `out` is an (n, 3) float64 buffer with room for the path,
+    the rows are written into it and a view is returned.
+    """
+    vx, vy = normalize_velocity(vx, vy, speed)
+    return _trace_trajectory(
+        float(start_x), float(start_y), float(vx), float(vy),
+        float(start_time), float(end_time),
+        float(width), float(height),
+        out
+    )
+
+
+def backward_trajectory_array(
+    end_x: float, end_y: float,
+    vx: float, vy: float,
+    end_time: float, start_time: float,
+    width: float, height: float,
+    speed: float,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Calculate backward trajectory as an (k, 3) array of (x, y, time) rows.
+    
+    Rows are in chronological order (start to end), matching
+    calculate_backward_trajectory. `out` works as in forward_trajectory_array.
+    """
+    # Reverse the velocity to trace backwards
+    reverse_vx, reverse_vy = normalize_velocity(-vx, -vy, speed)
+    traced = _trace_trajectory(
+        float(end_x), float(end_y), float(reverse_vx), float(reverse_vy),
+        float(end_time), float(start_time),
+        float(width), float(height),
+        out
+    )
+    # Reverse in place to get chronological order
+    traced[:] = traced[::-1].copy()
+    return traced
+
+
 def calculate_forward_trajectory(
     start_x: float, start_y: float,
     vx: float, vy: float,
@@ -95,44 +177,10 @@ def calculate_forward_trajectory(
     
     Returns list of keyframes including start position and all wall bounces.
     """
-    keyframes = [Keyframe(x=start_x, y=start_y, time=start_time)]
-    
-    current_x, current_y = start_x, start_y
-    current_vx, current_vy = normalize_velocity(vx, vy, speed)
-    current_time = start_time
-    
-    while current_time < end_time:
-        time_to_wall, wall = calculate_time_to_wall(
-            current_x, current_y,
-            current_vx, current_vy,
-            width, height
-        )
-        
-        # Check if we reach end_time before hitting a wall
-        remaining_time = end_time - current_time
-        
-        if time_to_wall >= remaining_time:
-            # Move to final position
-            final_x = current_x + current_vx * remaining_time
-            final_y = current_y + current_vy * remaining_time
-            keyframes.append(Keyframe(x=final_x, y=final_y, time=end_time))
-            break
-        else:
-            # Move to wall and bounce
-            current_x += current_vx * time_to_wall
-            current_y += current_vy * time_to_wall
-            current_time += time_to_wall
-            
-            # Clamp to wall boundaries to avoid floating point drift
-            current_x = max(0, min(width, current_x))
-            current_y = max(0, min(height, current_y))
-            
-            keyframes.append(Keyframe(x=current_x, y=current_y, time=current_time))
-            
-            # Reflect velocity
-            current_vx, current_vy = reflect_velocity(current_vx, current_vy, wall)
-    
-    return keyframes
+    arr = forward_trajectory_array(
+        start_x, start_y, vx, vy, start_time, end_time, width, height, speed
+    )
+    return [Keyframe(x=x, y=y, time=t) for x, y, t in arr.tolist()]
 
 
 def calculate_backward_trajectory(
@@ -148,49 +196,10 @@ def calculate_backward_trajectory(
     
     Returns list of keyframes in chronological order (start to end).
     """
-    # Reverse the velocity to trace backwards
-    reverse_vx, reverse_vy = -vx, -vy
-    
-    keyframes = [Keyframe(x=end_x, y=end_y, time=end_time)]
-    
-    current_x, current_y = end_x, end_y
-    current_vx, current_vy = normalize_velocity(reverse_vx, reverse_vy, speed)
-    current_time = end_time
-    
-    while current_time > start_time:
-        time_to_wall, wall = calculate_time_to_wall(
-            current_x, current_y,
-            current_vx, current_vy,
-            width, height
-        )
-        
-        # Time remaining to trace back
-        remaining_time = current_time - start_time
-        
-        if time_to_wall >= remaining_time:
-            # Move to initial position
-            initial_x = current_x + current_vx * remaining_time
-            initial_y = current_y + current_vy * remaining_time
-            keyframes.append(Keyframe(x=initial_x, y=initial_y, time=start_time))
-            break
-        else:
-            # Move to wall and bounce
-            current_x += current_vx * time_to_wall
-            current_y += current_vy * time_to_wall
-            current_time -= time_to_wall
-            
-            # Clamp to boundaries
-            current_x = max(0, min(width, current_x))
-            current_y = max(0, min(height, current_y))
-            
-            keyframes.append(Keyframe(x=current_x, y=current_y, time=current_time))
-            
-            # Reflect velocity for the bounce
-            current_vx, current_vy = reflect_velocity(current_vx, current_vy, wall)
-    
-    # Reverse to get chronological order
-    keyframes.reverse()
-    return keyframes
+    arr = backward_trajectory_array(
+        end_x, end_y, vx, vy, end_time, start_time, width, height, speed
+    )
+    return [Keyframe(x=x, y=y, time=t) for x, y, t in arr.tolist()]
 
 
 def average_velocity(vx1: float, vy1: float, vx2: float, vy2: float, speed: float) -> Tuple[float, float]:
@@ -206,5 +215,3 @@ def average_velocity(vx1: float, vy1: float, vx2: float, vy2: float, speed: floa
         return random_velocity(speed)
     
     return normalize_velocity(avg_vx, avg_vy, speed)
-
-
@@ -0,0 +1,167 @@
+"""
+Batch trajectory calculation.
+Traces many bouncing paths at once into rows of a shared keyframe buffer.
+"""
+
+import math
+import numpy as np
+from typing import List
+
+from _trajectory_numba import HAVE_NUMBA, _trace_into
+from trajectory import _trace_trajectory
+
+
+def trace_trajectories_numpy(
+    out: np.ndarray,
+    x: np.ndarray, y: np.ndarray,
+    vx: np.ndarray, vy: np.ndarray,
+    from_time: np.ndarray, to_time: np.ndarray,
+    width: float, height: float
+) -> np.ndarray:
+    """
+    Trace N paths together as NumPy arrays, one wall bounce per iteration.
+    
+    Vectorized equivalent of running _trace_into on every row of `out`
+    (an (N, K, 3) buffer): each iteration finds the next wall for every
+    path still in flight, writes its bounce or final keyframe, and flips
+    the velocity of the bounced paths. Same float operations, so the rows
+    match _trace_into exactly.
+    
+    Args:
+        out: (N, K, 3) float64 buffer; row i receives path i's keyframes
+        x, y: Start positions, shape (N,)
+        vx, vy: Normalized velocities along the direction of travel, shape (N,)
+        from_time, to_time: Start and end times (to_time < from_time traces backwards)
+        width: Container width
+        height: Container height
+    
+    Returns:
+        (N,) array of keyframe counts; -1 where the row was too small
+    """
+    x = np.array(x, dtype=np.float64)
+    y = np.array(y, dtype=np.float64)
+    vx = np.array(vx, dtype=np.float64)
+    vy = np.array(vy, dtype=np.float64)
+    from_time = np.asarray(from_time, dtype=np.float64)
+    to_time = np.asarray(to_time, dtype=np.float64)
+    
+    capacity = out.shape[1]
+    counts = np.ones(len(x), dtype=np.intp)
+    if capacity == 0:
+        counts[:] = -1
+        return counts
+    
+    out[:, 0, 0] = x
+    out[:, 0, 1] = y
+    out[:, 0, 2] = from_time
+    
+    direction = np.where(to_time >= from_time, 1.0, -1.0)
+    current_time = from_time.copy()
+    in_flight = np.flatnonzero((to_time - current_time) * direction > 0)
+    
+    while in_flight.size:
+        full = counts[in_flight] == capacity
+        if full.any():
+            counts[in_flight[full]] = -1
+            in_flight = in_flight[~full]
+            if not in_flight.size:
+                break
+        
+        px, py = x[in_flight], y[in_flight]
+        pvx, pvy = vx[in_flight], vy[in_flight]
+        
+        # Time to the nearest x and y wall ahead (inf if not moving towards one)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_x = np.where(pvx < 0, -px / pvx, np.where(pvx > 0, (width - px) / pvx, math.inf))
+            t_y = np.where(pvy < 0, -py / pvy, np.where(pvy > 0, (height - py) / pvy, math.inf))
+        t_x[~(t_x > 1e-10)] = math.inf
+        t_y[~(t_y > 1e-10)] = math.inf
+        hit_x = t_x <= t_y  # Ties go to the x wall
+        time_to_wall = np.minimum(t_x, t_y)
+        
+        remaining_time = (to_time[in_flight] - current_time[in_flight]) * direction[in_flight]
+        
+        # Paths that reach to_time before hitting a wall
+        done = time_to_wall >= remaining_time
+        rows = in_flight[done]
+        cols = counts[rows]
+        out[rows, cols, 0] = px[done] + pvx[done] * remaining_time[done]
+        out[rows, cols, 1] = py[done] + pvy[done] * remaining_time[done]
+        out[rows, cols, 2] = to_time[rows]
+        counts[rows] += 1
+        
+        # Move the rest to their wall and bounce
+        bounce = ~done
+        rows = in_flight[bounce]
+        cols = counts[rows]
+        step = time_to_wall[bounce]
+        current_time[rows] += direction[rows] * step
+        
+        # Clamp to wall boundaries to avoid floating point drift
+        x[rows] = np.maximum(0.0, np.minimum(width, px[bounce] + pvx[bounce] * step))
+        y[rows] = np.maximum(0.0, np.minimum(height, py[bounce] + pvy[bounce] * step))
+        
+        out[rows, cols, 0] = x[rows]
+        out[rows, cols, 1] = y[rows]
+        out[rows, cols, 2] = current_time[rows]
+        counts[rows] += 1
+        
+        hit_x = hit_x[bounce]
+        vx[rows] = np.where(hit_x, -pvx[bounce], pvx[bounce])
+        vy[rows] = np.where(hit_x, pvy[bounce], -pvy[bounce])
+        
+        in_flight = rows[(to_time[rows] - current_time[rows]) * direction[rows] > 0]
+    
+    return counts
+
+
+def trace_trajectories(
+    out: np.ndarray,
+    x: np.ndarray, y: np.ndarray,
+    vx: np.ndarray, vy: np.ndarray,
+    from_time: np.ndarray, to_time: np.ndarray,
+    width: float, height: float
+) -> List[np.ndarray]:
+    """
+    Trace N bouncing paths into the rows of a shared (N, K, 3) buffer.
+    
+    Uses the compiled per-path kernel when numba is installed and the
+    vectorized NumPy pass otherwise (much faster than the kernel as plain
+    Python). Paths that don't fit their row are
+    traced into their own array. Backward paths (to_time < from_time)
+    are returned in chronological order, like backward_trajectory_array.
+    
+    Args:
+        out: (N, K, 3) float64 buffer; row i receives path i's keyframes
+        x, y: Start positions, shape (N,)
+        vx, vy: Normalized velocities along the direction of travel, shape (N,)
+        from_time, to_time: Start and end times, shape (N,)
+        width: Container width
+        height: Container height
+    
+    Returns:
+        List of N (k, 3) keyframe arrays, views into `out` where they fit
+    """
+    if HAVE_NUMBA:
+        paths = zip(*(
+            np.asarray(values, dtype=np.float64).tolist()
+            for values in (x, y, vx, vy, from_time, to_time)
+        ))
+        counts = [_trace_into(row, *path, width, height) for row, path in zip(out, paths)]
+    else:
+        counts = trace_trajectories_numpy(out, x, y, vx, vy, from_time, to_time, width, height)
+    
+    trajectories = []
+    for i, count in enumerate(counts):
+        if count >= 0:
+            traced = out[i, :count]
+        else:
+            traced = _trace_trajectory(
+                float(x[i]), float(y[i]), float(vx[i]), float(vy[i]),
+                float(from_time[i]), float(to_time[i]), width, height
+            )
+        if to_time[i] < from_time[i]:
+            # Reverse in place to get chronological order
+            traced[:] = traced[::-1].copy()
+        trajectories.append(traced)
+    return trajectories